@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import Category, Listing, Review, Submission, User, Address, Comment
+from .models import Category, Listing, Review, Submission, ArchivedSubmission, User, Address, Comment
 
 # Create a custom Admin class for the User model.
 class UserAdmin(BaseUserAdmin):
@@ -33,6 +33,24 @@ class SubmissionAdmin(admin.ModelAdmin):
         queryset.update(status='rejected')
         self.message_user(request, "Selected submissions have been rejected.")
 
+class ArchivedSubmissionAdmin(admin.ModelAdmin):
+    """
+    Read-only Admin interface for archived submissions.
+    """
+    list_display = ('business_name', 'contact_email', 'category', 'status', 'created_at', 'archived_at')
+    list_filter = ('status', 'category')
+    search_fields = ('business_name', 'contact_email')
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 class ListingAdmin(admin.ModelAdmin):
     """
     Custom Admin interface for the Listing model.
@@ -76,5 +94,6 @@ admin.site.register(Category, CategoryAdmin)
 admin.site.register(Listing, ListingAdmin)
 admin.site.register(Review, ReviewAdmin)
 admin.site.register(Submission, SubmissionAdmin)
+admin.site.register(ArchivedSubmission, ArchivedSubmissionAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Address, AddressAdmin)
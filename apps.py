@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DirectoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'directory'
+
+    def ready(self):
+        # Register signal handlers and system checks.
+        from . import checks, signals  # noqa: F401
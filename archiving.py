@@ -0,0 +1,50 @@
+from django.db import transaction
+
+from .models import Address, ArchivedSubmission, Submission
+
+ARCHIVABLE_STATUSES = ('approved', 'rejected')
+SUBMISSION_FIELDS = (
+    'business_name', 'description', 'contact_email', 'phone_number',
+    'website_url', 'category_id', 'status', 'created_at',
+)
+ADDRESS_FIELDS = ('street', 'city', 'province_state', 'country', 'latitude', 'longitude')
+
+
+def archivable_submissions(cutoff):
+    return Submission.objects.filter(status__in=ARCHIVABLE_STATUSES, created_at__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size=500):
+    """
+    Moves up to `batch_size` processed submissions created before `cutoff`,
+    and their addresses, into the archive in a single transaction.
+    Returns the number of submissions archived.
+    """
+    with transaction.atomic():
+        submissions = list(
+            archivable_submissions(cutoff)
+            .select_for_update()
+            .order_by('pk')[:batch_size]
+        )
+        if not submissions:
+            return 0
+
+        addresses = {
+            address.submission_address_id: address
+            for address in Address.objects.filter(submission_address__in=submissions)
+        }
+        archived = []
+        for submission in submissions:
+            address = addresses.get(submission.pk)
+            archived.append(ArchivedSubmission(
+                original_id=submission.pk,
+                **{field: getattr(submission, field) for field in SUBMISSION_FIELDS},
+                **{field: getattr(address, field) if address else None for field in ADDRESS_FIELDS},
+            ))
+        # Copy and delete share a transaction; an existing archive row for the
+        # same submission fails the whole batch rather than losing data.
+        ArchivedSubmission.objects.bulk_create(archived)
+        # Deleting the submissions cascades to their addresses.
+        Submission.objects.filter(pk__in=[submission.pk for submission in submissions]).delete()
+        return len(submissions)
+
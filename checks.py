@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PINNING_MIDDLEWARE = 'directory.middleware.PrimaryPinningMiddleware'
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_pinning_cache(app_configs, **kwargs):
+    """
+    Token clients are pinned to the primary through the default cache, which
+    must be shared by every worker process for the pin to be seen.
+    """
+    if PINNING_MIDDLEWARE not in settings.MIDDLEWARE:
+        return []
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            f"{PINNING_MIDDLEWARE} stores pins in the default cache, which uses {backend}.",
+            hint="Configure a cache shared by all workers (e.g. Redis or Memcached), "
+                 "otherwise token clients only see their own writes on the worker that handled them.",
+            id='directory.W001',
+        )]
+    return []
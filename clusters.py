@@ -0,0 +1,151 @@
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Address, ListingMapPoint, MapTile
+
+MAX_LATITUDE = 85.05112878
+
+
+def get_max_zoom():
+    return getattr(settings, 'DIRECTORY_MAP_MAX_ZOOM', 16)
+
+
+def tile_for(latitude, longitude, zoom):
+    """
+    Returns the (x, y) Web Mercator tile containing the point at `zoom`.
+    """
+    n = 2 ** zoom
+    latitude = max(min(latitude, MAX_LATITUDE), -MAX_LATITUDE)
+    longitude = max(min(longitude, 180.0), -180.0)
+    lat_rad = math.radians(latitude)
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _apply_point(latitude, longitude, sign):
+    for zoom in range(get_max_zoom() + 1):
+        x, y = tile_for(latitude, longitude, zoom)
+        tiles = MapTile.objects.filter(zoom=zoom, x=x, y=y)
+        changes = {
+            'count': F('count') + sign,
+            'latitude_sum': F('latitude_sum') + sign * latitude,
+            'longitude_sum': F('longitude_sum') + sign * longitude,
+        }
+        if sign < 0:
+            tiles.update(**changes)
+            tiles.filter(count__lte=0).delete()
+            continue
+        # get_or_create handles two writers creating the same tile; retry if a
+        # concurrent removal deleted the emptied tile before the update landed.
+        while True:
+            MapTile.objects.get_or_create(zoom=zoom, x=x, y=y)
+            if tiles.update(**changes):
+                break
+
+
+def sync_listing_point(listing_id):
+    """
+    Brings the tile aggregates in line with the listing's current address and
+    active state, touching one tile per zoom level for the old and new point.
+    """
+    with transaction.atomic():
+        wanted = (
+            Address.objects
+            .filter(
+                listing_id=listing_id, listing__is_active=True,
+                latitude__isnull=False, longitude__isnull=False,
+            )
+            .values_list('latitude', 'longitude')
+            .first()
+        )
+        point = ListingMapPoint.objects.select_for_update().filter(listing_id=listing_id).first()
+        current = (point.latitude, point.longitude) if point else None
+        if current == wanted:
+            return
+
+        if current is not None:
+            _apply_point(*current, sign=-1)
+        if wanted is None:
+            point.delete()
+            return
+        _apply_point(*wanted, sign=1)
+        ListingMapPoint.objects.update_or_create(
+            listing_id=listing_id,
+            defaults={'latitude': wanted[0], 'longitude': wanted[1]},
+        )
+
+
+def remove_listing_point(listing_id):
+    with transaction.atomic():
+        point = ListingMapPoint.objects.select_for_update().filter(listing_id=listing_id).first()
+        if point is not None:
+            _apply_point(point.latitude, point.longitude, sign=-1)
+            point.delete()
+
+
+def rebuild_tiles(batch_size=1000):
+    """
+    Recomputes every tile aggregate from scratch. Returns a (points, tiles) tuple.
+    """
+    max_zoom = get_max_zoom()
+    tiles = defaultdict(lambda: [0, 0.0, 0.0])
+    points = []
+    addresses = (
+        Address.objects
+        .filter(listing__isnull=False, listing__is_active=True, latitude__isnull=False, longitude__isnull=False)
+        .values_list('listing_id', 'latitude', 'longitude')
+    )
+    for listing_id, latitude, longitude in addresses.iterator(chunk_size=batch_size):
+        points.append(ListingMapPoint(listing_id=listing_id, latitude=latitude, longitude=longitude))
+        for zoom in range(max_zoom + 1):
+            tile = tiles[(zoom, *tile_for(latitude, longitude, zoom))]
+            tile[0] += 1
+            tile[1] += latitude
+            tile[2] += longitude
+
+    with transaction.atomic():
+        MapTile.objects.all().delete()
+        ListingMapPoint.objects.all().delete()
+        ListingMapPoint.objects.bulk_create(points, batch_size=batch_size)
+        MapTile.objects.bulk_create(
+            (
+                MapTile(zoom=zoom, x=x, y=y, count=count, latitude_sum=lat_sum, longitude_sum=lng_sum)
+                for (zoom, x, y), (count, lat_sum, lng_sum) in tiles.items()
+            ),
+            batch_size=batch_size,
+        )
+    return len(points), len(tiles)
+
+
+def _tile_range(min_lng, min_lat, max_lng, max_lat, zoom):
+    min_x, min_y = tile_for(max_lat, min_lng, zoom)
+    max_x, max_y = tile_for(min_lat, max_lng, zoom)
+    return min_x, min_y, max_x, max_y
+
+
+def zoom_for_bbox(min_lng, min_lat, max_lng, max_lat, zoom, max_tiles):
+    """
+    The highest zoom level at or below `zoom` at which the bounding box spans
+    at most `max_tiles` tiles.
+    """
+    while zoom > 0:
+        min_x, min_y, max_x, max_y = _tile_range(min_lng, min_lat, max_lng, max_lat, zoom)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) <= max_tiles:
+            break
+        zoom -= 1
+    return zoom
+
+
+def tiles_in_bbox(min_lng, min_lat, max_lng, max_lat, zoom):
+    """
+    The non-empty tiles at `zoom` that intersect the bounding box.
+    """
+    min_x, min_y, max_x, max_y = _tile_range(min_lng, min_lat, max_lng, max_lat, zoom)
+    return MapTile.objects.filter(
+        zoom=zoom, x__gte=min_x, x__lte=max_x, y__gte=min_y, y__lte=max_y,
+    ).order_by('x', 'y')
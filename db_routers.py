@@ -0,0 +1,99 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# True while reads must see the primary, False inside a request scope that is
+# not (yet) pinned, and None outside any request scope.
+_use_primary = ContextVar('directory_use_primary', default=None)
+
+
+def get_primary_database():
+    return getattr(settings, 'DIRECTORY_PRIMARY_DATABASE', 'default')
+
+
+def get_replica_databases():
+    return list(getattr(settings, 'DIRECTORY_REPLICA_DATABASES', []))
+
+
+def is_pinned():
+    return bool(_use_primary.get())
+
+
+def set_pinned(value):
+    """
+    Sets whether reads in the current context go to the primary. Setting a
+    boolean also opens a request scope in which writes pin the rest of the
+    scope to the primary. Returns a token that can be passed to `unpin` to
+    restore the previous state.
+    """
+    return _use_primary.set(value)
+
+
+def pin_to_primary():
+    """
+    Sends every following read in the current context to the primary.
+    """
+    return set_pinned(True)
+
+
+def unpin(token):
+    _use_primary.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """
+    Context manager that forces reads inside the block to go to the primary.
+    """
+    token = pin_to_primary()
+    try:
+        yield
+    finally:
+        unpin(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router that sends writes to the primary and spreads reads over the
+    replicas listed in `DIRECTORY_REPLICA_DATABASES`.
+
+    Reads go to the primary instead when the current context is pinned (see
+    `PrimaryPinningMiddleware`), after a write in the same request scope,
+    inside a transaction on the primary, or when following a relation from an
+    object that was loaded from the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        primary = get_primary_database()
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == primary:
+            return primary
+        replicas = get_replica_databases()
+        # Reads inside a transaction on the primary must see its uncommitted writes.
+        if not replicas or is_pinned() or connections[primary].in_atomic_block:
+            return primary
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Read-your-writes: anything read after this point in the same request
+        # comes from the primary. Outside a request scope (shell, management
+        # commands, task workers) nothing would ever reset the pin, so none is
+        # taken; wrap such code in `use_primary()` when it needs its own writes.
+        if _use_primary.get() is False:
+            pin_to_primary()
+        return get_primary_database()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {get_primary_database(), *get_replica_databases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema through replication.
+        if db in get_replica_databases():
+            return False
+        return None
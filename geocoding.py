@@ -0,0 +1,185 @@
+import csv
+import re
+import sqlite3
+from contextlib import closing
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .clusters import sync_listing_point
+from .models import Address
+from .signals import record_listing_change
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(value):
+    """
+    Normalizes a single address component for gazetteer lookups:
+    case-folded, punctuation stripped and whitespace collapsed.
+    """
+    if not value:
+        return ''
+    value = _PUNCTUATION.sub(' ', str(value).casefold())
+    return _WHITESPACE.sub(' ', value).strip()
+
+
+class Gazetteer:
+    """
+    An in-memory, indexed lookup of place names to coordinates.
+
+    Each gazetteer row has a `name` (a city or postal area), an optional
+    `province_state`, a `country` and its `latitude`/`longitude`. Rows are
+    indexed both by (name, province_state, country) and by (name, country) so
+    addresses without a province/state can still be resolved.
+    """
+    COLUMNS = ('name', 'province_state', 'country', 'latitude', 'longitude')
+    MEMO_SIZE = 10000
+
+    def __init__(self, rows=()):
+        self._by_region = {}
+        self._by_country = {}
+        # Bounded memo of lookups on the raw address components.
+        self.lookup = lru_cache(maxsize=self.MEMO_SIZE)(self._lookup)
+        for row in rows:
+            self.add(**row)
+
+    def __len__(self):
+        return len(self._by_region)
+
+    def add(self, name, country, latitude, longitude, province_state=''):
+        name, country = normalize(name), normalize(country)
+        if not name or not country:
+            return
+        try:
+            point = (float(latitude), float(longitude))
+        except (TypeError, ValueError):
+            # Skip rows with missing or malformed coordinates.
+            return
+        self._by_region.setdefault((name, normalize(province_state), country), point)
+        self._by_country.setdefault((name, country), point)
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, newline='', encoding='utf-8') as fh:
+            return cls(
+                {column: row.get(column) or '' for column in cls.COLUMNS}
+                for row in csv.DictReader(fh)
+            )
+
+    @classmethod
+    def from_sqlite(cls, path, table='gazetteer'):
+        with closing(sqlite3.connect(path)) as conn:
+            cursor = conn.execute(f"SELECT {', '.join(cls.COLUMNS)} FROM {table}")
+            return cls(
+                {column: value or '' for column, value in zip(cls.COLUMNS, row)}
+                for row in cursor
+            )
+
+    @classmethod
+    def from_path(cls, path):
+        if str(path).endswith(('.sqlite', '.sqlite3', '.db')):
+            return cls.from_sqlite(path)
+        return cls.from_csv(path)
+
+    def _lookup(self, city, province_state, country):
+        """
+        Returns a (latitude, longitude) tuple for the given address components,
+        or None if the place is not in the gazetteer. Exposed as `lookup`,
+        memoized so repeated addresses skip normalization.
+        """
+        key = (normalize(city), normalize(province_state), normalize(country))
+        point = self._by_region.get(key)
+        if point is None:
+            point = self._by_country.get((key[0], key[2]))
+        return point
+
+
+@lru_cache(maxsize=1)
+def get_gazetteer():
+    """
+    Loads the gazetteer configured by `DIRECTORY_GAZETTEER_PATH` once per process.
+    Returns None if no gazetteer is configured.
+    """
+    path = getattr(settings, 'DIRECTORY_GAZETTEER_PATH', None)
+    if not path:
+        return None
+    return Gazetteer.from_path(path)
+
+
+def geocode_address(address, gazetteer=None):
+    """
+    Fills in the latitude/longitude of an unsaved or in-memory Address.
+    Returns True if the address was resolved. The caller is responsible for saving.
+    """
+    if gazetteer is None:
+        gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return False
+    point = gazetteer.lookup(address.city, address.province_state, address.country)
+    if point is None:
+        return False
+    address.latitude, address.longitude = point
+    return True
+
+
+def pending_addresses():
+    """
+    Addresses that have a city and country but are missing coordinates.
+    """
+    return (
+        Address.objects
+        .filter(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+        .exclude(city__isnull=True).exclude(city='')
+        .exclude(country__isnull=True).exclude(country='')
+    )
+
+
+def _geocode_batch(ids, gazetteer):
+    with transaction.atomic():
+        addresses = list(
+            Address.objects.filter(pk__in=ids)
+            .only('id', 'city', 'province_state', 'country', 'latitude', 'longitude', 'listing_id')
+        )
+        resolved = [address for address in addresses if geocode_address(address, gazetteer)]
+        Address.objects.bulk_update(resolved, ['latitude', 'longitude'])
+        # bulk_update skips post_save, so journal and place newly located listings
+        # on the map here, in the same transaction so a batch is never left half done.
+        for address in resolved:
+            if address.listing_id is not None:
+                record_listing_change(address.listing_id, 'updated')
+                sync_listing_point(address.listing_id)
+        return len(resolved)
+
+
+def geocode_pending(gazetteer=None, batch_size=500):
+    """
+    Resolves every pending address against the gazetteer in batches of
+    `batch_size`. Each batch is written back with a single bulk_update in its
+    own transaction.
+
+    Pending ids are paged by primary key, so rows that cannot be resolved are
+    not rescanned within a run.
+
+    Returns a (scanned, resolved) tuple.
+    """
+    if gazetteer is None:
+        gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return 0, 0
+
+    scanned = resolved = 0
+    last_id = 0
+    while True:
+        ids = list(
+            pending_addresses().filter(pk__gt=last_id)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return scanned, resolved
+        last_id = ids[-1]
+        scanned += len(ids)
+        resolved += _geocode_batch(ids, gazetteer)
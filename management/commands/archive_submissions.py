@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from directory.archiving import archivable_submissions, archive_batch
+
+
+class Command(BaseCommand):
+    help = "Moves approved and rejected submissions older than a cutoff into the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=30)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batches', type=int, help="Stop after this many batches; run again to resume.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        if options['dry_run']:
+            count = archivable_submissions(cutoff).count()
+            self.stdout.write(f"{count} submissions would be archived.")
+            return
+
+        total = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            moved = archive_batch(cutoff, options['batch_size'])
+            if not moved:
+                break
+            total += moved
+            batches += 1
+            self.stdout.write(f"Archived batch {batches} ({moved} submissions).")
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} submissions created before {cutoff:%Y-%m-%d}."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from directory.trending import compact
+
+
+class Command(BaseCommand):
+    help = "Trims trending scores to the top K per category and drops decayed entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, help="Defaults to DIRECTORY_TRENDING_TOP_K.")
+        parser.add_argument('--min-score', type=float, default=0.01)
+
+    def handle(self, *args, **options):
+        deleted, updated = compact(top_k=options['top_k'], min_score=options['min_score'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} trending entries, refreshed {updated}."))
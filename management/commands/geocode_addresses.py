@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from directory.geocoding import Gazetteer, geocode_pending, get_gazetteer
+
+
+class Command(BaseCommand):
+    help = "Fills in latitude/longitude for addresses using a local gazetteer file."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--gazetteer',
+            help="Path to a gazetteer CSV or SQLite file. Defaults to DIRECTORY_GAZETTEER_PATH.",
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options['gazetteer']:
+            gazetteer = Gazetteer.from_path(options['gazetteer'])
+        else:
+            gazetteer = get_gazetteer()
+        if gazetteer is None:
+            raise CommandError("No gazetteer configured. Pass --gazetteer or set DIRECTORY_GAZETTEER_PATH.")
+
+        scanned, resolved = geocode_pending(gazetteer, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Geocoded {resolved} of {scanned} pending addresses ({len(gazetteer)} places loaded)."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from directory.clusters import rebuild_tiles
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the map tile aggregates used by the listing clusters endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        points, tiles = rebuild_tiles(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {points} listings into {tiles} map tiles."))
@@ -0,0 +1,73 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import permissions
+
+from .db_routers import set_pinned, unpin
+
+PIN_COOKIE_NAME = 'directory_primary_until'
+
+
+class PrimaryPinningMiddleware:
+    """
+    Pins a client to the primary database for `DIRECTORY_PRIMARY_PIN_SECONDS`
+    after it makes a write request, so it immediately sees its own changes
+    (e.g. the review it just posted) even if the replicas are lagging.
+
+    Unsafe methods always run against the primary. Clients are recognised by
+    their Authorization header (token clients rarely keep cookies) and,
+    failing that, by a cookie. Authorization pins live in the default cache,
+    so it must be shared between worker processes (see check directory.W001).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        is_write = request.method not in permissions.SAFE_METHODS
+        # Always set (and reset) the flag so a pin taken by the router during
+        # this request does not leak into the next one served by this thread.
+        token = set_pinned(is_write or self._is_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            unpin(token)
+
+        if is_write:
+            self._pin(request, response)
+        return response
+
+    def _pin_seconds(self):
+        return getattr(settings, 'DIRECTORY_PRIMARY_PIN_SECONDS', 5)
+
+    def _cache_key(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        digest = hashlib.sha256(authorization.encode()).hexdigest()
+        return f'directory:primary-pin:{digest}'
+
+    def _is_pinned(self, request):
+        key = self._cache_key(request)
+        if key is not None and cache.get(key):
+            return True
+        try:
+            until = float(request.COOKIES.get(PIN_COOKIE_NAME, 0))
+        except ValueError:
+            return False
+        return until > time.time()
+
+    def _pin(self, request, response):
+        seconds = self._pin_seconds()
+        key = self._cache_key(request)
+        if key is not None:
+            cache.set(key, True, timeout=seconds)
+        response.set_cookie(
+            PIN_COOKIE_NAME,
+            str(time.time() + seconds),
+            max_age=seconds,
+            httponly=True,
+            samesite='Lax',
+        )
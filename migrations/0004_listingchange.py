@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_listing_changes(apps, schema_editor):
+    # Give existing listings a place in the change journal, oldest change first.
+    Listing = apps.get_model('directory', 'Listing')
+    ListingChange = apps.get_model('directory', 'ListingChange')
+    db_alias = schema_editor.connection.alias
+    ListingChange.objects.using(db_alias).bulk_create(
+        ListingChange(
+            listing_id=listing.pk,
+            kind='updated' if listing.is_active else 'deactivated',
+            changed_at=listing.updated_at,
+        )
+        for listing in Listing.objects.using(db_alias).order_by('updated_at', 'pk').only('pk', 'is_active', 'updated_at')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directory', '0003_remove_listing_address_review_user_address_comment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('listing_id', models.BigIntegerField(db_index=True)),
+                ('kind', models.CharField(choices=[('updated', 'Updated'), ('deactivated', 'Deactivated'), ('deleted', 'Deleted')], max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(seed_listing_changes, migrations.RunPython.noop),
+    ]
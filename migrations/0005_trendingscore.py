@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directory', '0004_listingchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending_score', serialize=False, to='directory.listing')),
+                ('score', models.FloatField(default=0)),
+                ('scored_at', models.DateTimeField()),
+                ('rank_key', models.FloatField(db_index=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_scores', to='directory.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', '-rank_key'], name='directory_t_categor_a1430e_idx')],
+            },
+        ),
+    ]
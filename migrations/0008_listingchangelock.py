@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:38
+
+from django.db import migrations, models
+
+
+def create_lock_row(apps, schema_editor):
+    ListingChangeLock = apps.get_model('directory', 'ListingChangeLock')
+    ListingChangeLock.objects.using(schema_editor.connection.alias).get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directory', '0007_archivedsubmission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingChangeLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.RunPython(create_lock_row, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, Group, Permission
 
 class User(AbstractUser):
@@ -44,6 +45,11 @@ class Address(models.Model):
     def __str__(self):
         return f"{self.street}, {self.city}"
 
+    def save(self, *args, **kwargs):
+        # Keep the change journal and map tiles written by post_save in the same transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 class Listing(models.Model):
     business_name = models.CharField(max_length=255)
     description = models.TextField()
@@ -58,6 +64,92 @@ class Listing(models.Model):
     def __str__(self):
         return self.business_name
 
+    def save(self, *args, **kwargs):
+        # Keep the change journal and map tiles written by post_save in the same transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+class ListingChange(models.Model):
+    """
+    Change journal used by the listing change feed. Holds at most one row per
+    listing: every change replaces the previous row, so `seq` always points at
+    the listing's latest change. `listing_id` is not a foreign key so that
+    tombstones survive the listing being deleted.
+    """
+    KIND_CHOICES = (
+        ('updated', 'Updated'),
+        ('deactivated', 'Deactivated'),
+        ('deleted', 'Deleted'),
+    )
+    seq = models.BigAutoField(primary_key=True)
+    listing_id = models.BigIntegerField(db_index=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} listing {self.listing_id} (#{self.seq})"
+
+class ListingChangeLock(models.Model):
+    """
+    Single-row table locked by every writer of the change journal, so journal
+    sequence numbers are allocated and committed in the same order.
+    """
+    def __str__(self):
+        return "Listing change journal lock"
+
+class TrendingScore(models.Model):
+    """
+    Time-decayed activity score for a listing. `score` is the value as of
+    `scored_at` and is decayed lazily on read. `rank_key` is the log of the
+    score projected forward in time, so ordering by it ranks listings by their
+    current decayed score without touching every row.
+    """
+    listing = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='trending_score')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='trending_scores')
+    score = models.FloatField(default=0)
+    scored_at = models.DateTimeField()
+    rank_key = models.FloatField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', '-rank_key']),
+        ]
+
+    def __str__(self):
+        return f"Trending score for {self.listing.business_name}"
+
+class ListingMapPoint(models.Model):
+    """
+    The coordinates a listing currently contributes to the map tile aggregates.
+    Kept so a change can subtract the old point before adding the new one.
+    """
+    listing = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='map_point')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    def __str__(self):
+        return f"Map point for {self.listing.business_name}"
+
+class MapTile(models.Model):
+    """
+    Aggregate of the active listings inside one Web Mercator tile at one zoom
+    level. Each point is counted once per zoom level, forming a quadtree.
+    """
+    zoom = models.PositiveSmallIntegerField()
+    x = models.IntegerField()
+    y = models.IntegerField()
+    count = models.IntegerField(default=0)
+    latitude_sum = models.FloatField(default=0)
+    longitude_sum = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zoom', 'x', 'y'], name='unique_map_tile'),
+        ]
+
+    def __str__(self):
+        return f"Tile {self.zoom}/{self.x}/{self.y} ({self.count})"
+
 class Review(models.Model):
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='reviews')
     rating = models.IntegerField()
@@ -94,3 +186,28 @@ class Submission(models.Model):
 
     def __str__(self):
         return self.business_name
+
+class ArchivedSubmission(models.Model):
+    """
+    An approved or rejected Submission moved out of the moderation table,
+    together with the address it still owned at the time.
+    """
+    original_id = models.BigIntegerField(unique=True)
+    business_name = models.CharField(max_length=255)
+    description = models.TextField()
+    contact_email = models.EmailField()
+    phone_number = models.CharField(max_length=20, blank=True)
+    website_url = models.URLField(blank=True)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+')
+    status = models.CharField(max_length=20, choices=Submission.STATUS_CHOICES)
+    created_at = models.DateTimeField(db_index=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    street = models.CharField(max_length=255, blank=True, null=True)
+    city = models.CharField(max_length=255, blank=True, null=True)
+    province_state = models.CharField(max_length=255, blank=True, null=True)
+    country = models.CharField(max_length=255, blank=True, null=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return self.business_name
@@ -1,5 +1,9 @@
 from rest_framework import serializers
-from .models import Category, Submission, Listing, Address, Review, Comment, User
+from .models import (
+    Category, Submission, ArchivedSubmission, Listing, ListingChange, TrendingScore, MapTile,
+    Address, Review, Comment, User,
+)
+from .trending import decayed_score
 from django.db import transaction
 from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
@@ -72,11 +76,22 @@ class SubmissionSerializer(serializers.ModelSerializer):
             Address.objects.create(submission_address=submission, **address_data)
             return submission
 
+# This serializer exposes archived submissions read-only to administrators.
+class ArchivedSubmissionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedSubmission
+        fields = [
+            'id', 'original_id', 'business_name', 'description', 'contact_email', 'phone_number',
+            'website_url', 'category', 'status', 'created_at', 'archived_at',
+            'street', 'city', 'province_state', 'country', 'latitude', 'longitude',
+        ]
+        read_only_fields = fields
+
 # This serializer handles the Listing model. It includes the Address and Category serializers
 # to provide a complete view of a listing as specified in your API documentation.
 class ListingSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
-    address = AddressSerializer(read_only=True)
+    address = AddressSerializer(source='address_listing', read_only=True, allow_null=True)
 
     class Meta:
         model = Listing
@@ -85,6 +100,64 @@ class ListingSerializer(serializers.ModelSerializer):
             'website_url', 'created_at', 'category', 'address'
         ]
 
+# This serializer renders one entry of the listing change feed. Live listings are
+# passed in through the `listings` context (keyed by id) to avoid a query per entry;
+# entries whose listing is missing or inactive are rendered as tombstones.
+class ListingChangeSerializer(serializers.ModelSerializer):
+    cursor = serializers.IntegerField(source='seq', read_only=True)
+    id = serializers.IntegerField(source='listing_id', read_only=True)
+    kind = serializers.SerializerMethodField()
+    listing = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ListingChange
+        fields = ['cursor', 'id', 'kind', 'changed_at', 'listing']
+
+    def _get_live_listing(self, obj):
+        listing = self.context.get('listings', {}).get(obj.listing_id)
+        if listing is None or not listing.is_active:
+            return None
+        return listing
+
+    def get_kind(self, obj):
+        if obj.kind == 'updated' and self._get_live_listing(obj) is None:
+            # Changed outside of save() (e.g. a bulk update) since it was journalled.
+            return 'deleted' if obj.listing_id not in self.context.get('listings', {}) else 'deactivated'
+        return obj.kind
+
+    def get_listing(self, obj):
+        listing = self._get_live_listing(obj)
+        if listing is None:
+            return None
+        return ListingSerializer(listing, context=self.context).data
+
+# This serializer renders a trending listing together with its current decayed score.
+class TrendingListingSerializer(serializers.ModelSerializer):
+    score = serializers.SerializerMethodField()
+    listing = ListingSerializer(read_only=True)
+
+    class Meta:
+        model = TrendingScore
+        fields = ['score', 'listing']
+
+    def get_score(self, obj):
+        return round(decayed_score(obj.score, obj.scored_at, self.context.get('now')), 4)
+
+# This serializer renders a map tile aggregate as a cluster centred on its listings.
+class MapClusterSerializer(serializers.ModelSerializer):
+    latitude = serializers.SerializerMethodField()
+    longitude = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MapTile
+        fields = ['zoom', 'x', 'y', 'count', 'latitude', 'longitude']
+
+    def get_latitude(self, obj):
+        return obj.latitude_sum / obj.count
+
+    def get_longitude(self, obj):
+        return obj.longitude_sum / obj.count
+
 # This is a serializer for a POST request to update a listing.
 class ListingUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .clusters import remove_listing_point, sync_listing_point
+from .models import Address, Listing, ListingChange, ListingChangeLock
+from .trending import sync_listing_category
+
+
+def record_listing_change(listing_id, kind):
+    """
+    Moves the listing to the head of the change journal, in the same
+    transaction as the change itself.
+
+    Writers take a row lock on ListingChangeLock before allocating a sequence
+    number and hold it until they commit. Sequence numbers therefore become
+    visible in increasing order, and a reader that has seen `seq` N will never
+    later find an uncommitted change below N. The cost is that listing and
+    address writes serialize on that lock.
+    """
+    with transaction.atomic():
+        ListingChangeLock.objects.select_for_update().get_or_create(pk=1)
+        ListingChange.objects.filter(listing_id=listing_id).delete()
+        ListingChange.objects.create(listing_id=listing_id, kind=kind)
+
+
+@receiver(post_save, sender=Listing)
+def listing_saved(sender, instance, **kwargs):
+    record_listing_change(instance.pk, 'updated' if instance.is_active else 'deactivated')
+    sync_listing_point(instance.pk)
+    sync_listing_category(instance)
+
+
+@receiver(pre_delete, sender=Listing)
+def listing_deleting(sender, instance, **kwargs):
+    # The map point cascades with the listing, so subtract it from the tiles first.
+    remove_listing_point(instance.pk)
+
+
+@receiver(post_delete, sender=Listing)
+def listing_deleted(sender, instance, **kwargs):
+    record_listing_change(instance.pk, 'deleted')
+
+
+@receiver(pre_save, sender=Address)
+def address_saving(sender, instance, **kwargs):
+    # Remember which listing the address belonged to, in case it is being moved.
+    instance._previous_listing_id = None
+    if instance.pk is not None:
+        instance._previous_listing_id = (
+            Address.objects.filter(pk=instance.pk).values_list('listing_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Address)
+def address_saved(sender, instance, **kwargs):
+    # A listing's address is part of its public representation.
+    listing_ids = {instance.listing_id, getattr(instance, '_previous_listing_id', None)} - {None}
+    for listing_id in sorted(listing_ids):
+        record_listing_change(listing_id, 'updated')
+        sync_listing_point(listing_id)
+
+
+@receiver(post_delete, sender=Address)
+def address_deleted(sender, instance, **kwargs):
+    if instance.listing_id is not None:
+        record_listing_change(instance.listing_id, 'updated')
+        sync_listing_point(instance.listing_id)
@@ -1,3 +1,473 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.db import IntegrityError, connections, router
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .archiving import archive_batch
+from .clusters import rebuild_tiles
+from .db_routers import is_pinned, set_pinned, unpin, use_primary
+from .geocoding import Gazetteer, geocode_pending, get_gazetteer
+from .models import (
+    Address, ArchivedSubmission, Category, Listing, ListingMapPoint, MapTile, Review, Submission,
+    TrendingScore, User,
+)
+from .trending import compact, record_activity
+
+
+class GazetteerTests(TestCase):
+    """
+    Tests for the in-memory gazetteer lookups.
+    """
+    def setUp(self):
+        self.gazetteer = Gazetteer([
+            {'name': 'Springfield', 'province_state': 'Illinois', 'country': 'USA', 'latitude': '39.78', 'longitude': '-89.65'},
+            {'name': 'Springfield', 'province_state': 'Missouri', 'country': 'USA', 'latitude': '37.21', 'longitude': '-93.29'},
+            {'name': 'Paris', 'province_state': '', 'country': 'France', 'latitude': '48.85', 'longitude': '2.35'},
+            {'name': 'Nowhere', 'province_state': '', 'country': 'France', 'latitude': '', 'longitude': '1.0'},
+        ])
+
+    def test_lookup_matches_region(self):
+        self.assertEqual(self.gazetteer.lookup('springfield', 'Missouri', 'usa'), (37.21, -93.29))
+
+    def test_lookup_falls_back_to_country(self):
+        self.assertEqual(self.gazetteer.lookup('Paris.', None, 'FRANCE'), (48.85, 2.35))
+        self.assertEqual(self.gazetteer.lookup('Springfield', 'Unknown', 'USA'), (39.78, -89.65))
+
+    def test_lookup_unknown_place(self):
+        self.assertIsNone(self.gazetteer.lookup('Atlantis', None, 'France'))
+
+    def test_rows_without_coordinates_are_skipped(self):
+        self.assertEqual(len(self.gazetteer), 3)
+        self.assertIsNone(self.gazetteer.lookup('Nowhere', None, 'France'))
+
+    def test_from_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fh:
+            fh.write("name,province_state,country,latitude,longitude\nParis,,France,48.85,2.35\nLyon,,France,,\n")
+        self.addCleanup(os.unlink, fh.name)
+        gazetteer = Gazetteer.from_path(fh.name)
+        self.assertEqual(len(gazetteer), 1)
+        self.assertEqual(gazetteer.lookup('Paris', '', 'France'), (48.85, 2.35))
+
+
+class GeocodePendingTests(TestCase):
+    """
+    Tests for batch geocoding of addresses.
+    """
+    def setUp(self):
+        self.gazetteer = Gazetteer([
+            {'name': 'Paris', 'country': 'France', 'latitude': 48.85, 'longitude': 2.35},
+        ])
+        category = Category.objects.create(name='Food', description='')
+        self.listing = Listing.objects.create(business_name='Cafe', description='', category=category)
+
+    def test_resolves_pending_addresses_in_batches(self):
+        Address.objects.create(listing=self.listing, city='Paris', country='France')
+        for _ in range(4):
+            Address.objects.create(city='Paris', country='France')
+        Address.objects.create(city='Atlantis', country='France')
+
+        self.assertEqual(geocode_pending(self.gazetteer, batch_size=2), (6, 5))
+        self.assertEqual(Address.objects.filter(latitude=48.85, longitude=2.35).count(), 5)
+        # The listing's newly located address is placed on the map.
+        self.assertEqual(MapTile.objects.get(zoom=0).count, 1)
+
+
+
+class ApproveSubmissionTests(TestCase):
+    """
+    Tests for approving a submission into a listing.
+    """
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fh:
+            fh.write("name,province_state,country,latitude,longitude\nParis,,France,48.85,2.35\n")
+        self.addCleanup(os.unlink, fh.name)
+        self.gazetteer_path = fh.name
+        get_gazetteer.cache_clear()
+        self.addCleanup(get_gazetteer.cache_clear)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', password='secret', is_staff=True))
+        self.submission = Submission.objects.create(
+            business_name='Cafe', description='', contact_email='owner@example.com',
+            category=Category.objects.create(name='Food', description=''),
+        )
+        Address.objects.create(submission_address=self.submission, city='Paris', country='France')
+
+    def approve(self):
+        response = self.client.post(f'/api/admin/submissions/{self.submission.id}/approve/')
+        self.assertEqual(response.status_code, 200)
+        listing = Listing.objects.get(pk=response.data['listing_id'])
+        self.assertEqual(listing.business_name, 'Cafe')
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, 'approved')
+        return Address.objects.get(listing=listing)
+
+    def test_approve_geocodes_address(self):
+        with self.settings(DIRECTORY_GAZETTEER_PATH=self.gazetteer_path):
+            address = self.approve()
+        self.assertIsNone(address.submission_address)
+        self.assertEqual((address.latitude, address.longitude), (48.85, 2.35))
+
+    def test_approve_without_geocoding(self):
+        with self.settings(DIRECTORY_GAZETTEER_PATH=self.gazetteer_path, DIRECTORY_GEOCODE_ON_APPROVE=False):
+            address = self.approve()
+        self.assertEqual((address.latitude, address.longitude), (None, None))
+
+
+@skipUnless('replica' in settings.DATABASES, "Needs a 'replica' alias mirroring 'default'.")
+@override_settings(
+    DATABASE_ROUTERS=['directory.db_routers.PrimaryReplicaRouter'],
+    DIRECTORY_REPLICA_DATABASES=['replica'],
+    MIDDLEWARE=settings.MIDDLEWARE + ['directory.middleware.PrimaryPinningMiddleware'],
+)
+class PrimaryReplicaRoutingTests(TransactionTestCase):
+    """
+    Tests for replica reads and read-your-writes pinning. Run with a 'replica'
+    alias configured with TEST = {'MIRROR': 'default'}.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        category = Category.objects.create(name='Food', description='')
+        self.listing = Listing.objects.create(business_name='Cafe', description='', category=category)
+        self.user = User.objects.create_user('reviewer', password='secret')
+
+    def get(self, client, url):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def test_unpinned_reads_use_replica(self):
+        primary, replica = self.get(APIClient(), '/api/listings/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_writes_use_primary_and_pin_client(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = client.post(
+                f'/api/listings/{self.listing.id}/reviews/',
+                {'listing': self.listing.id, 'rating': 5, 'comment': 'Great'},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(replica), 0)
+
+        primary, replica = self.get(client, f'/api/listings/{self.listing.id}/reviews/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Other clients keep reading from the replica.
+        primary, replica = self.get(APIClient(), f'/api/listings/{self.listing.id}/reviews/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_writes_outside_requests_do_not_pin(self):
+        Listing.objects.create(business_name='Bakery', description='', category=self.listing.category)
+        self.assertFalse(is_pinned())
+        self.assertEqual(router.db_for_read(Listing), 'replica')
+
+        with use_primary():
+            self.assertEqual(router.db_for_read(Listing), 'default')
+        self.assertEqual(router.db_for_read(Listing), 'replica')
+
+    def test_writes_inside_request_scope_pin_until_reset(self):
+        token = set_pinned(False)
+        Listing.objects.create(business_name='Bakery', description='', category=self.listing.category)
+        self.assertEqual(router.db_for_read(Listing), 'default')
+        unpin(token)
+        self.assertEqual(router.db_for_read(Listing), 'replica')
+
+
+class ListingChangeFeedTests(TestCase):
+    """
+    Tests for the incremental listing change feed.
+    """
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name='Food', description='')
+        self.listings = [
+            Listing.objects.create(business_name=f'Listing {i}', description='', category=category)
+            for i in range(4)
+        ]
+
+    def fetch(self, since=0, limit=None):
+        url = f'/api/listings/changes/?since={since}'
+        if limit:
+            url += f'&limit={limit}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_pages_by_cursor(self):
+        first = self.fetch(limit=3)
+        self.assertTrue(first['has_more'])
+        self.assertEqual([entry['id'] for entry in first['results']], [listing.id for listing in self.listings[:3]])
+
+        second = self.fetch(since=first['next_cursor'], limit=3)
+        self.assertFalse(second['has_more'])
+        self.assertEqual([entry['id'] for entry in second['results']], [self.listings[3].id])
+
+        third = self.fetch(since=second['next_cursor'])
+        self.assertEqual(third['results'], [])
+        self.assertEqual(third['next_cursor'], second['next_cursor'])
+
+    def test_only_returns_changes_after_cursor(self):
+        cursor = self.fetch()['next_cursor']
+        Address.objects.create(listing=self.listings[0], city='Paris', latitude=48.85, longitude=2.35)
+
+        results = self.fetch(since=cursor)['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['kind'], 'updated')
+        self.assertEqual(results[0]['listing']['address']['city'], 'Paris')
+
+    def test_geocoded_addresses_are_journalled(self):
+        Address.objects.create(listing=self.listings[1], city='Paris', country='France')
+        cursor = self.fetch()['next_cursor']
+        gazetteer = Gazetteer([{'name': 'Paris', 'country': 'France', 'latitude': 48.85, 'longitude': 2.35}])
+        geocode_pending(gazetteer)
+
+        results = self.fetch(since=cursor)['results']
+        self.assertEqual([entry['id'] for entry in results], [self.listings[1].id])
+        address = results[0]['listing']['address']
+        self.assertEqual((address['latitude'], address['longitude']), (48.85, 2.35))
+
+    def test_tombstones(self):
+        cursor = self.fetch()['next_cursor']
+        deactivated, deleted = self.listings[0], self.listings[1]
+        deleted_id = deleted.id
+        deactivated.is_active = False
+        deactivated.save()
+        deleted.delete()
+
+        results = self.fetch(since=cursor)['results']
+        self.assertEqual(
+            [(entry['id'], entry['kind'], entry['listing']) for entry in results],
+            [(deactivated.id, 'deactivated', None), (deleted_id, 'deleted', None)],
+        )
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/listings/changes/?since=abc').status_code, 400)
+
+
+class TrendingTests(TestCase):
+    """
+    Tests for time-decayed trending scores.
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.food = Category.objects.create(name='Food', description='')
+        self.shops = Category.objects.create(name='Shops', description='')
+        self.cafe = Listing.objects.create(business_name='Cafe', description='', category=self.food)
+        self.bakery = Listing.objects.create(business_name='Bakery', description='', category=self.food)
+        self.store = Listing.objects.create(business_name='Store', description='', category=self.shops)
+
+    def trending(self, query=''):
+        response = self.client.get(f'/api/listings/trending/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [(entry['listing']['business_name'], entry['score']) for entry in response.data]
+
+    def test_older_activity_decays(self):
+        # Ten points three half-lives ago are worth 1.25 now, less than two recent points.
+        three_days_ago = timezone.now() - timedelta(days=3)
+        for _ in range(5):
+            record_activity(self.bakery, 2.0, now=three_days_ago)
+        record_activity(self.cafe, 2.0)
+
+        self.assertEqual(self.trending(), [('Cafe', 2.0), ('Bakery', 1.25)])
+
+    def test_filters_by_category(self):
+        record_activity(self.cafe, 1.0)
+        record_activity(self.store, 3.0)
+        self.assertEqual(self.trending(f'?category={self.food.id}'), [('Cafe', 1.0)])
+
+    def test_review_and_comment_creation_records_activity(self):
+        user = User.objects.create_user('reviewer', password='secret')
+        self.client.force_authenticate(user)
+        review = self.client.post(
+            f'/api/listings/{self.cafe.id}/reviews/',
+            {'listing': self.cafe.id, 'rating': 5, 'comment': 'Great'},
+            format='json',
+        ).data
+        self.client.post(
+            f'/api/listings/{self.cafe.id}/reviews/{review["id"]}/comments/',
+            {'review': review['id'], 'text': 'Agreed'},
+            format='json',
+        )
+        self.assertEqual(self.trending(), [('Cafe', 4.0)])
+
+    def test_review_is_not_saved_when_scoring_fails(self):
+        self.client.force_authenticate(User.objects.create_user('reviewer', password='secret'))
+        with mock.patch('directory.views.record_activity', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(
+                    f'/api/listings/{self.cafe.id}/reviews/',
+                    {'listing': self.cafe.id, 'rating': 5, 'comment': 'Great'},
+                    format='json',
+                )
+        self.assertFalse(Review.objects.exists())
+
+    def test_category_follows_listing(self):
+        record_activity(self.cafe, 1.0)
+        self.cafe.category = self.shops
+        self.cafe.save()
+        self.assertEqual(self.trending(f'?category={self.shops.id}'), [('Cafe', 1.0)])
+
+    def test_compact_refreshes_categories(self):
+        record_activity(self.cafe, 1.0)
+        Listing.objects.filter(pk=self.cafe.pk).update(category=self.shops)
+        compact()
+        self.assertEqual(self.trending(f'?category={self.shops.id}'), [('Cafe', 1.0)])
+        self.assertEqual(self.trending(f'?category={self.food.id}'), [])
+
+    def test_compact_keeps_top_k_and_drops_decayed(self):
+        record_activity(self.cafe, 2.0)
+        record_activity(self.bakery, 1.0)
+        record_activity(self.store, 1.0, now=timezone.now() - timedelta(days=30))
+
+        self.assertEqual(compact(top_k=1), (2, 1))
+        self.assertEqual(list(TrendingScore.objects.values_list('listing_id', flat=True)), [self.cafe.id])
+
+
+class MapClusterTests(TestCase):
+    """
+    Tests for the precomputed map tile aggregates.
+    """
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name='Food', description='')
+        self.paris = [
+            Listing.objects.create(business_name=f'Paris {i}', description='', category=category)
+            for i in range(2)
+        ]
+        self.new_york = Listing.objects.create(business_name='New York', description='', category=category)
+        Address.objects.create(listing=self.paris[0], city='Paris', latitude=48.85, longitude=2.35)
+        Address.objects.create(listing=self.paris[1], city='Paris', latitude=48.86, longitude=2.34)
+        self.new_york_address = Address.objects.create(
+            listing=self.new_york, city='New York', latitude=40.7, longitude=-74.0,
+        )
+
+    def world_count(self):
+        tile = MapTile.objects.filter(zoom=0).first()
+        return tile.count if tile else 0
+
+    def test_counts_follow_activation_and_deletion(self):
+        self.assertEqual(self.world_count(), 3)
+
+        self.paris[0].is_active = False
+        self.paris[0].save()
+        self.assertEqual(self.world_count(), 2)
+
+        self.paris[0].is_active = True
+        self.paris[0].save()
+        self.assertEqual(self.world_count(), 3)
+
+        self.new_york.delete()
+        self.assertEqual(self.world_count(), 2)
+
+        # Tiles that only held New York are removed rather than left empty.
+        self.assertEqual(MapTile.objects.count(), MapTile.objects.filter(count__gt=0).count())
+
+    def test_moving_an_address_updates_both_listings(self):
+        self.new_york_address.listing = self.paris[0]
+        Address.objects.filter(listing=self.paris[0]).exclude(pk=self.new_york_address.pk).delete()
+        self.new_york_address.save()
+
+        self.assertFalse(ListingMapPoint.objects.filter(listing=self.new_york).exists())
+        self.assertEqual(ListingMapPoint.objects.get(listing=self.paris[0]).latitude, 40.7)
+        self.assertEqual(self.world_count(), 2)
+
+    def test_matches_rebuild(self):
+        self.paris[1].is_active = False
+        self.paris[1].save()
+        incremental = sorted(MapTile.objects.values_list('zoom', 'x', 'y', 'count'))
+        rebuild_tiles()
+        self.assertEqual(incremental, sorted(MapTile.objects.values_list('zoom', 'x', 'y', 'count')))
+
+    def test_clusters_endpoint(self):
+        response = self.client.get('/api/listings/clusters/?bbox=-180,-85,180,85&zoom=0')
+        self.assertEqual(response.status_code, 200)
+        clusters = sorted((cluster['count'], round(cluster['latitude'], 3)) for cluster in response.data)
+        self.assertEqual(clusters, [(1, 40.7), (2, 48.855)])
+
+    def test_wide_viewport_coarsens_instead_of_truncating(self):
+        response = self.client.get('/api/listings/clusters/?bbox=-180,-85,180,85&zoom=14')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(cluster['count'] for cluster in response.data), 3)
+        self.assertLess(response.data[0]['zoom'], 14)
+
+    def test_invalid_bbox(self):
+        self.assertEqual(self.client.get('/api/listings/clusters/?bbox=3,48,2,49').status_code, 400)
+        self.assertEqual(self.client.get('/api/listings/clusters/?zoom=3').status_code, 400)
+        self.assertEqual(self.client.get('/api/listings/clusters/?bbox=nan,nan,nan,nan&zoom=3').status_code, 400)
+        self.assertEqual(self.client.get('/api/listings/clusters/?bbox=inf,0,inf,1&zoom=2').status_code, 400)
+        self.assertEqual(self.client.get('/api/listings/clusters/?bbox=-inf,0,1,1&zoom=2').status_code, 400)
+
+    def test_out_of_range_bbox_is_clamped(self):
+        response = self.client.get('/api/listings/clusters/?bbox=-500,-100,500,100&zoom=0')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(cluster['count'] for cluster in response.data), 3)
+
+
+class ArchiveSubmissionsTests(TestCase):
+    """
+    Tests for moving processed submissions into the archive.
+    """
+    def setUp(self):
+        self.category = Category.objects.create(name='Food', description='')
+        self.cutoff = timezone.now() - timedelta(days=30)
+        for status in ('pending', 'approved', 'rejected', 'rejected'):
+            submission = Submission.objects.create(
+                business_name=f'{status} business', description='', contact_email='owner@example.com',
+                category=self.category, status=status,
+            )
+            Address.objects.create(submission_address=submission, city='Paris')
+        Submission.objects.update(created_at=self.cutoff - timedelta(days=1))
+
+    def test_moves_processed_submissions_in_batches(self):
+        self.assertEqual(archive_batch(self.cutoff, batch_size=2), 2)
+        self.assertEqual(archive_batch(self.cutoff, batch_size=2), 1)
+        self.assertEqual(archive_batch(self.cutoff, batch_size=2), 0)
+
+        self.assertEqual(list(Submission.objects.values_list('status', flat=True)), ['pending'])
+        self.assertEqual(Address.objects.count(), 1)
+        self.assertEqual(
+            sorted(ArchivedSubmission.objects.values_list('status', 'city')),
+            [('approved', 'Paris'), ('rejected', 'Paris'), ('rejected', 'Paris')],
+        )
+
+    def test_recent_submissions_stay(self):
+        Submission.objects.filter(status='approved').update(created_at=timezone.now())
+        self.assertEqual(archive_batch(self.cutoff), 2)
+        self.assertEqual(Submission.objects.filter(status='approved').count(), 1)
+
+    def test_conflict_fails_the_batch(self):
+        submission = Submission.objects.get(status='approved')
+        ArchivedSubmission.objects.create(
+            original_id=submission.pk, business_name='', description='', contact_email='owner@example.com',
+            status='approved', created_at=submission.created_at,
+        )
+        with self.assertRaises(IntegrityError):
+            archive_batch(self.cutoff)
+        self.assertEqual(Submission.objects.count(), 4)
+
+    def test_archive_api_is_read_only(self):
+        archive_batch(self.cutoff)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('admin', password='secret', is_staff=True))
+
+        response = client.get('/api/admin/archived-submissions/?status=rejected')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+        archived_id = response.data[0]['id']
+        self.assertEqual(client.delete(f'/api/admin/archived-submissions/{archived_id}/').status_code, 405)
@@ -0,0 +1,143 @@
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import Listing, TrendingScore
+
+REVIEW_WEIGHT = 2.0
+RATING_WEIGHT = 0.2
+COMMENT_WEIGHT = 1.0
+
+
+def get_half_life_seconds():
+    return getattr(settings, 'DIRECTORY_TRENDING_HALF_LIFE_HOURS', 24) * 3600
+
+
+def get_top_k():
+    return getattr(settings, 'DIRECTORY_TRENDING_TOP_K', 100)
+
+
+def _decay_rate():
+    return math.log(2) / get_half_life_seconds()
+
+
+def decayed_score(score, scored_at, now=None):
+    """
+    Decays a score stored at `scored_at` to its value at `now`.
+    """
+    now = now or timezone.now()
+    elapsed = max((now - scored_at).total_seconds(), 0)
+    return score * math.exp(-_decay_rate() * elapsed)
+
+
+def rank_key(score, scored_at):
+    """
+    log(score) projected forward to `scored_at`. For any two entries, comparing
+    rank keys gives the same order as comparing their decayed scores at any
+    later time.
+    """
+    if score <= 0:
+        return float('-inf')
+    return math.log(score) + _decay_rate() * scored_at.timestamp()
+
+
+def review_weight(rating):
+    return REVIEW_WEIGHT + RATING_WEIGHT * (rating or 0)
+
+
+def record_activity(listing, weight, now=None):
+    """
+    Adds `weight` to the listing's trending score, decaying the stored score
+    up to now first.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        entry, created = TrendingScore.objects.select_for_update().get_or_create(
+            listing=listing,
+            defaults={
+                'category_id': listing.category_id,
+                'score': weight,
+                'scored_at': now,
+                'rank_key': rank_key(weight, now),
+            },
+        )
+        if not created:
+            entry.score = decayed_score(entry.score, entry.scored_at, now) + weight
+            entry.scored_at = now
+            entry.category_id = listing.category_id
+            entry.rank_key = rank_key(entry.score, now)
+            entry.save()
+    return entry
+
+
+def sync_listing_category(listing):
+    """
+    Moves the listing's trending entry to the listing's current category.
+    """
+    TrendingScore.objects.filter(listing=listing).exclude(
+        category_id=listing.category_id
+    ).update(category_id=listing.category_id)
+
+
+def top_listings(category=None, limit=None):
+    """
+    The highest scoring active listings, optionally limited to one category.
+    """
+    limit = min(limit or get_top_k(), get_top_k())
+    queryset = TrendingScore.objects.filter(listing__is_active=True)
+    if category is not None:
+        queryset = queryset.filter(category=category)
+    return (
+        queryset
+        .select_related('listing__category__parent_category', 'listing__address_listing')
+        .order_by('-rank_key')[:limit]
+    )
+
+
+def compact(top_k=None, min_score=0.01, now=None, batch_size=500):
+    """
+    Keeps only the top `top_k` entries per category, drops entries whose
+    decayed score has fallen below `min_score` and refreshes the stored
+    scores and rank keys (in case the half-life setting changed). Entries are
+    first moved to their listing's current category.
+
+    Each category is compacted in its own transaction without row locks.
+    Writes are conditional on `scored_at` being unchanged, so an entry that
+    receives activity meanwhile is left as `record_activity` wrote it.
+
+    Returns a (deleted, updated) tuple.
+    """
+    now = now or timezone.now()
+    top_k = top_k or get_top_k()
+
+    TrendingScore.objects.exclude(category_id=F('listing__category_id')).update(
+        category_id=Subquery(Listing.objects.filter(pk=OuterRef('listing_id')).values('category_id'))
+    )
+
+    deleted = updated = 0
+    category_ids = TrendingScore.objects.values_list('category_id', flat=True).distinct().order_by()
+    for category_id in list(category_ids):
+        with transaction.atomic():
+            entries = list(
+                TrendingScore.objects.filter(category_id=category_id)
+                .only('pk', 'score', 'scored_at', 'rank_key')
+                .order_by('-rank_key')
+            )
+            removed = []
+            for position, entry in enumerate(entries):
+                score = decayed_score(entry.score, entry.scored_at, now)
+                if position >= top_k or score < min_score:
+                    removed.append(entry)
+                    continue
+                updated += TrendingScore.objects.filter(pk=entry.pk, scored_at=entry.scored_at).update(
+                    score=score, scored_at=now, rank_key=rank_key(score, now),
+                )
+            for start in range(0, len(removed), batch_size):
+                unchanged = Q()
+                for entry in removed[start:start + batch_size]:
+                    unchanged |= Q(pk=entry.pk, scored_at=entry.scored_at)
+                deleted += TrendingScore.objects.filter(unchanged).delete()[0]
+    return deleted, updated
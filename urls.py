@@ -5,6 +5,7 @@ from .views import (
     ListingViewSet,
     SubmissionViewSet,
     SubmissionAdminViewSet,
+    ArchivedSubmissionAdminViewSet,
     CategoryViewSet,
     ListingAdminViewSet,
     CategoryAdminViewSet,
@@ -33,6 +34,7 @@ reviews_router.register(r'comments', CommentViewSet, basename='review-comments')
 # These routes are for a future authenticated admin panel.
 admin_router = DefaultRouter()
 admin_router.register(r'submissions', SubmissionAdminViewSet, basename='admin-submission')
+admin_router.register(r'archived-submissions', ArchivedSubmissionAdminViewSet, basename='admin-archived-submission')
 admin_router.register(r'listings', ListingAdminViewSet, basename='admin-listing')
 admin_router.register(r'categories', CategoryAdminViewSet, basename='admin-category')
 
@@ -1,5 +1,9 @@
+import math
+
+from django.conf import settings
 from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -7,10 +11,17 @@ from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser, I
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
-from .models import Listing, Submission, Category, Review, Comment, User
+from .models import Listing, ListingChange, Submission, ArchivedSubmission, Category, Review, Comment, User, Address
+from .clusters import get_max_zoom, tiles_in_bbox, zoom_for_bbox
+from .geocoding import geocode_address, get_gazetteer
+from .trending import COMMENT_WEIGHT, record_activity, review_weight, top_listings
 from .serializers import (
     ListingSerializer,
+    ListingChangeSerializer,
+    TrendingListingSerializer,
+    MapClusterSerializer,
     SubmissionSerializer,
+    ArchivedSubmissionSerializer,
     CategorySerializer,
     ReviewSerializer,
     CommentSerializer,
@@ -43,9 +54,93 @@ class ListingViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows listings to be viewed.
     """
-    queryset = Listing.objects.filter(is_active=True).order_by('business_name')
+    queryset = (
+        Listing.objects.filter(is_active=True)
+        .select_related('category__parent_category', 'address_listing')
+        .order_by('business_name')
+    )
     serializer_class = ListingSerializer
     lookup_field = 'id'
+    changes_page_size = 500
+    cluster_zoom_offset = 2
+    max_clusters = 1000
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Returns listings changed after the `since` cursor, oldest change first,
+        with tombstones for deactivated and deleted listings. Clients pass the
+        returned `next_cursor` back as `since` until `has_more` is false.
+        """
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', self.changes_page_size))
+        except ValueError:
+            return Response({"detail": "`since` and `limit` must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, self.changes_page_size))
+
+        changes = list(ListingChange.objects.filter(seq__gt=since).order_by('seq')[:limit + 1])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        listings = Listing.objects.filter(
+            id__in=[change.listing_id for change in changes]
+        ).select_related('category__parent_category', 'address_listing')
+        serializer = ListingChangeSerializer(
+            changes,
+            many=True,
+            context={**self.get_serializer_context(), 'listings': {listing.id: listing for listing in listings}},
+        )
+        return Response({
+            "results": serializer.data,
+            "next_cursor": changes[-1].seq if changes else since,
+            "has_more": has_more,
+        })
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """
+        Returns listings ranked by recent review and comment activity,
+        optionally filtered by `category`.
+        """
+        try:
+            category = request.query_params.get('category')
+            category = int(category) if category else None
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({"detail": "`category` and `limit` must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        entries = top_listings(category=category, limit=max(1, limit))
+        serializer = TrendingListingSerializer(
+            entries, many=True, context={**self.get_serializer_context(), 'now': timezone.now()}
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def clusters(self, request):
+        """
+        Returns listing clusters for a map viewport, one per non-empty tile.
+        `bbox` is "min_lng,min_lat,max_lng,max_lat" and `zoom` the map zoom level.
+        """
+        try:
+            min_lng, min_lat, max_lng, max_lat = (float(value) for value in request.query_params['bbox'].split(','))
+            zoom = int(request.query_params.get('zoom', 0))
+        except (KeyError, ValueError):
+            return Response(
+                {"detail": "`bbox` must be \"min_lng,min_lat,max_lng,max_lat\" and `zoom` an integer."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not all(math.isfinite(value) for value in (min_lng, min_lat, max_lng, max_lat)):
+            return Response({"detail": "`bbox` values must be finite numbers."}, status=status.HTTP_400_BAD_REQUEST)
+        if min_lng > max_lng or min_lat > max_lat:
+            return Response({"detail": "`bbox` minimums must not exceed its maximums."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Cluster a couple of levels below the map zoom so a viewport shows a handful of clusters
+        # per tile, coarsening until the whole viewport fits in `max_clusters` tiles.
+        zoom = max(0, min(zoom + self.cluster_zoom_offset, get_max_zoom()))
+        zoom = zoom_for_bbox(min_lng, min_lat, max_lng, max_lat, zoom, self.max_clusters)
+        tiles = tiles_in_bbox(min_lng, min_lat, max_lng, max_lat, zoom)
+        return Response(MapClusterSerializer(tiles, many=True).data)
 
 # ViewSet for public-facing Submission endpoints.
 class SubmissionViewSet(viewsets.ModelViewSet):
@@ -72,6 +167,8 @@ class SubmissionAdminViewSet(viewsets.ModelViewSet):
         Approves a submission and creates a new listing.
         """
         submission = get_object_or_404(Submission, pk=pk)
+        # Load the gazetteer before taking any locks; the first load reads the whole file.
+        gazetteer = get_gazetteer() if getattr(settings, 'DIRECTORY_GEOCODE_ON_APPROVE', True) else None
 
         with transaction.atomic():
             # Create a new Listing object from the submission data.
@@ -82,16 +179,20 @@ class SubmissionAdminViewSet(viewsets.ModelViewSet):
                 'phone_number': submission.phone_number,
                 'website_url': submission.website_url,
                 'category': submission.category,
-                'submission': submission,
                 'is_active': True,
             }
             listing = Listing.objects.create(**listing_data)
 
             # Retrieve and re-link the address from the submission to the new listing.
             try:
-                submission_address = submission.address
+                submission_address = submission.address_submission
                 submission_address.listing = listing
                 submission_address.submission_address = None # Unlink from submission
+                # Resolve coordinates from the local gazetteer if they were not submitted.
+                if gazetteer is not None and (
+                    submission_address.latitude is None or submission_address.longitude is None
+                ):
+                    geocode_address(submission_address, gazetteer)
                 submission_address.save()
             except Address.DoesNotExist:
                 pass
@@ -115,6 +216,23 @@ class SubmissionAdminViewSet(viewsets.ModelViewSet):
 
         return Response({"status": "Submission rejected."})
 
+# ViewSet for admin-only, read-only access to archived submissions.
+class ArchivedSubmissionAdminViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint that allows administrators to browse processed submissions
+    that have been moved to the archive.
+    """
+    queryset = ArchivedSubmission.objects.select_related('category').order_by('-created_at')
+    serializer_class = ArchivedSubmissionSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        return queryset
+
 # ViewSet for public-facing Category endpoints.
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -138,7 +256,7 @@ class ListingAdminViewSet(viewsets.ModelViewSet):
     """
     API endpoint for administrators to manage all listings.
     """
-    queryset = Listing.objects.all().order_by('business_name')
+    queryset = Listing.objects.select_related('category__parent_category', 'address_listing').order_by('business_name')
     permission_classes = [IsAdminUser]
 
     def get_serializer_class(self):
@@ -163,7 +281,10 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         listing = get_object_or_404(Listing, id=self.kwargs.get('listing_id'))
-        serializer.save(user=self.request.user, listing=listing)
+        # Count the review towards trending in the same transaction that saves it.
+        with transaction.atomic():
+            review = serializer.save(user=self.request.user, listing=listing)
+            record_activity(listing, review_weight(review.rating))
 
 # ViewSet for managing comments on a review.
 class CommentViewSet(viewsets.ModelViewSet):
@@ -180,5 +301,7 @@ class CommentViewSet(viewsets.ModelViewSet):
         return queryset
 
     def perform_create(self, serializer):
-        review = get_object_or_404(Review, id=self.kwargs.get('review_id'))
-        serializer.save(user=self.request.user, review=review)
+        review = get_object_or_404(Review.objects.select_related('listing'), id=self.kwargs.get('review_id'))
+        with transaction.atomic():
+            serializer.save(user=self.request.user, review=review)
+            record_activity(review.listing, COMMENT_WEIGHT)